@@ -1,20 +1,57 @@
+import asyncio
 import json
 import random
+from cache import H5DetectionCache, ResultCache, content_key
 
 class VLMAnalyzer:
     """
     Wrapper for Vision-Language Models (Qwen2.5-VL, LLaVA, Gemini).
     """
-    def __init__(self, model_id="Qwen/Qwen2.5-VL-7B-Instruct", local=True):
+    def __init__(self, model_id="Qwen/Qwen2.5-VL-7B-Instruct", local=True, cache_path=".vlm_cache.db"):
         self.model_id = model_id
         self.local = local
+        # Same image + same prompt => same answer, so skip the VLM on repeat runs
+        self.cache = ResultCache(cache_path) if cache_path else None
+        # In reality: self.stream = torch.cuda.Stream(), one per model so it overlaps the detector
         print(f"🧠 Initializing VLM Analyzer with {model_id} (Local={local})")
 
-    def analyze(self, image_path, prompt, expected_schema=None):
+    async def analyze(self, image_path, prompt, expected_schema=None, model=None, exemplar=None):
         """
         Analyze an image and return structured JSON.
+        model/exemplar come from APISelector.route: a cheap model can be
+        prompted with a prior answer to a similar query.
+        Results are cached by image content hash + model + normalized prompt.
         """
-        print(f"👁️  VLM Analysis on {image_path} with prompt: '{prompt}'")
+        model = model or self.model_id
+        cached = self.cached(image_path, prompt, model)
+        if cached is not None:
+            return cached
+        
+        # Model runs off the event loop so it can overlap the detector
+        result = await asyncio.to_thread(self._run_model, image_path, prompt, model, exemplar)
+        if self.cache and "error" not in result:
+            self.cache.set(self._key(image_path, prompt, model), result)
+        return result
+
+    def cached(self, image_path, prompt, model=None):
+        """
+        Exact cache lookup only, None on a miss. Never runs the model.
+        """
+        if not self.cache:
+            return None
+        cached = self.cache.get(self._key(image_path, prompt, model or self.model_id))
+        if cached is not None:
+            print(f"♻️  VLM cache hit for {image_path}")
+        return cached
+
+    def _key(self, image_path, prompt, model):
+        return content_key(image_path, model, " ".join(prompt.split()))
+
+    def _run_model(self, image_path, prompt, model, exemplar):
+        print(f"👁️  VLM Analysis ({model}) on {image_path} with prompt: '{prompt}'")
+        if exemplar is not None:
+            # In reality: the exemplar answer is prepended to the prompt as a worked example
+            print("   Using a cached answer to a similar query as exemplar")
         
         # MOCK IMPLEMENTATION (Simulating Qwen2.5-VL output)
         # In real implementation:
@@ -54,14 +91,33 @@ class ObjectDetector:
     """
     Wrapper for YOLOv11 / SAM 2.
     """
-    def __init__(self, model_path="yolo11x.pt"):
+    def __init__(self, model_path="yolo11x.pt", cache_path="det_cache.h5"):
         self.model_path = model_path
+        # Detection is deterministic per image, keep the bboxes on disk across runs
+        self.cache = H5DetectionCache(cache_path) if cache_path else None
+        # In reality: self.stream = torch.cuda.Stream(), one per model so it overlaps the VLM
         print(f"🕵️  Initializing Object Detector with {model_path}")
 
-    def detect(self, image_path, target_class="book"):
+    async def detect(self, image_path, target_class="book"):
         """
         Returns list of bounding boxes [x1, y1, x2, y2, conf, cls]
+        Results are cached in HDF5 by image content hash + target class.
         """
+        key = content_key(image_path, self.model_path, target_class)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"♻️  Detection cache hit for {image_path}")
+                # HDF5 rows are float64, restore int coordinates and class id like a fresh run
+                return [[int(x1), int(y1), int(x2), int(y2), float(conf), int(cls)]
+                        for x1, y1, x2, y2, conf, cls in cached.tolist()]
+        
+        bboxes = await asyncio.to_thread(self._run_model, image_path, target_class)
+        if self.cache:
+            self.cache.set(key, bboxes)
+        return bboxes
+
+    def _run_model(self, image_path, target_class):
         print(f"🔍 Detecting '{target_class}' in {image_path}")
         
         # MOCK IMPLEMENTATION
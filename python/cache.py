@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+import h5py
+import numpy as np
+
+def content_key(image_path, *parts):
+    """
+    SHA-256 over the image bytes plus any extra request parts (prompt, model...).
+    Falls back to the absolute path when the file doesn't exist (mock runs).
+    """
+    h = hashlib.sha256()
+    if os.path.exists(image_path):
+        with open(image_path, 'rb') as f:
+            h.update(f.read())
+    else:
+        h.update(os.path.abspath(image_path).encode())
+    for part in parts:
+        h.update(b'\0')
+        h.update(str(part).encode())
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    Persistent key -> JSON value store backed by SQLite.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)")
+
+    def get(self, key):
+        row = self.conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?)", (key, json.dumps(value)))
+        self.conn.commit()
+
+class H5DetectionCache:
+    """
+    Detection store backed by a single HDF5 file, one (N, 6) dataset per key.
+    The file is opened per call so concurrent runs don't block on its lock;
+    if another process holds it anyway, the call just runs uncached.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def get(self, key):
+        try:
+            with h5py.File(self.path, 'r') as h5:
+                if key in h5:
+                    return h5[key][:]
+        except OSError:
+            # Missing file or locked by another run
+            pass
+        return None
+
+    def set(self, key, bboxes):
+        data = np.asarray(bboxes, dtype=np.float64).reshape(-1, 6)
+        try:
+            with h5py.File(self.path, 'a') as h5:
+                if key not in h5:
+                    h5.create_dataset(key, data=data, chunks=True, maxshape=(None, 6))
+                # Flush before releasing the file so a crash never leaves it half-written
+                h5.flush()
+        except OSError:
+            print(f"⚠️  Detection cache {self.path} is locked, result not cached")
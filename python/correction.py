@@ -1,63 +1,170 @@
+import re
+from functools import lru_cache
+
+import numpy as np
 from PIL import Image, ImageDraw
 from geometry import calculate_grid_positions, calculate_spiral_positions
+from raster import rasterize_rects
+
+LABEL_SIZE = 32
+OUTLINE_WIDTH = 5
+MISSING_CELL_RE = re.compile(r"missing object at row (\d+), col (\d+)", re.IGNORECASE)
+
+@lru_cache(maxsize=None)
+def _label_glyph(n):
+    """
+    Rasterize the number hint once, later masks reuse the boolean glyph.
+    """
+    glyph = Image.new('L', (LABEL_SIZE, LABEL_SIZE), 0)
+    ImageDraw.Draw(glyph).text((LABEL_SIZE / 2, LABEL_SIZE / 2), str(n), fill=255, anchor="mm")
+    return np.asarray(glyph) > 0
+
+def _stamp_label(buf, n, cx, cy):
+    glyph = _label_glyph(n)
+    x, y = int(cx) - LABEL_SIZE // 2, int(cy) - LABEL_SIZE // 2
+    # Clip the glyph against the buffer edges
+    gx, gy = max(-x, 0), max(-y, 0)
+    region = buf[y + gy:y + LABEL_SIZE, x + gx:x + LABEL_SIZE]
+    h, w = region.shape[:2]
+    region[glyph[gy:gy + h, gx:gx + w]] = 255
+
+def _grid_cell_boxes(width, height, rows, cols):
+    # Grid settings (should ideally come from spec)
+    cell_w = width / (cols + 1) # Approximation
+    spacing = 20
+    grid_w = cols * (cell_w + spacing) - spacing
+    grid_h = rows * (cell_w + spacing) - spacing
+    
+    start_x = (width - grid_w) / 2
+    start_y = (height - grid_h) / 2
+    top_left = (start_x, start_y)
+    
+    # Calculate ideal positions
+    xs, ys = calculate_grid_positions(top_left, rows, cols, cell_w, cell_w, spacing)
+    
+    # Box corners are computed for all cells at once, truncated toward zero like PIL does.
+    # int64 explicitly: rasterize_rects is compiled for it, and int is int32 on Windows with numpy<2
+    half = cell_w / 2
+    x1 = (xs - half).astype(np.int64)
+    y1 = (ys - half).astype(np.int64)
+    x2 = (xs + half).astype(np.int64)
+    y2 = (ys + half).astype(np.int64)
+    return (xs, ys), (x1, y1, x2, y2)
+
+# Most real runs are one of these grids on the 1024x1024 canvas:
+# their box corners are computed once at import instead of for every mask
+_SPECIALIZED = {
+    (1024, 1024, rows, cols): _grid_cell_boxes(1024, 1024, rows, cols)[1]
+    for rows, cols in [(3, 3), (4, 4), (4, 5), (8, 8)]
+}
 
 class CorrectionEngine:
     def __init__(self):
         pass
 
-    def generate_grid_mask(self, width, height, rows, cols, detected_boxes=None):
+    def generate_grid_mask(self, width, height, rows, cols, detected_boxes=None, debug=False):
         """
         Generates a correction mask for a Grid layout.
         If detected_boxes passed, could try to only mask missing areas.
         For now, generates a full 'Guide' mask.
+        debug=True adds cell numbers (ControlNet ignores them, so off by default).
         """
         print(f"🛠️  Generating Grid Mask ({rows}x{cols}) for {width}x{height} image")
         
-        mask = Image.new('RGB', (width, height), (0, 0, 0)) # Black background
-        draw = ImageDraw.Draw(mask)
-        
-        # Grid settings (should ideally come from spec)
-        cell_w = width / (cols + 1) # Approximation
-        spacing = 20
-        grid_w = cols * (cell_w + spacing) - spacing
-        grid_h = rows * (cell_w + spacing) - spacing
+        mask = np.zeros((height, width), dtype=np.uint8) # Black background, single channel
         
-        start_x = (width - grid_w) / 2
-        start_y = (height - grid_h) / 2
-        top_left = (start_x, start_y)
+        # Draw white boxes (The "Hole" to fill or the "Guide" to keep)
+        # In inpainting: White = Inpaint (Change), Black = Keep.
+        # OR in ControlNet: This is the structure guide.
         
-        # Calculate ideal positions
-        centers = calculate_grid_positions(top_left, rows, cols, cell_w, cell_w, spacing)
+        # Let's assume this is a Canny/Depth ControlNet input
+        # We draw what we WANT to see.
+        # Draw clean rectangle outlines (inclusive corners, 5px inward)
+        boxes = _SPECIALIZED.get((width, height, rows, cols))
+        if boxes is None:
+            _, boxes = self.grid_cell_boxes(width, height, rows, cols)
+        x1, y1, x2, y2 = boxes
+        rasterize_rects(mask, x1, y1, x2, y2, OUTLINE_WIDTH)
         
-        for i, (cx, cy) in enumerate(centers):
-            # Draw white box (The "Hole" to fill or the "Guide" to keep)
-            # In inpainting: White = Inpaint (Change), Black = Keep.
-            # OR in ControlNet: This is the structure guide.
-            
-            # Let's assume this is a Canny/Depth ControlNet input
-            # We draw what we WANT to see.
-            half = cell_w / 2
-            x1, y1 = cx - half, cy - half
-            x2, y2 = cx + half, cy + half
-            
-            # Draw a clean rectangle outline
-            draw.rectangle([x1, y1, x2, y2], outline=(255, 255, 255), width=5)
-            
-            # Draw number hint
-            # draw.text((cx, cy), str(i+1), fill=(255, 255, 255))
-            
+        mask = Image.fromarray(mask)
+        # Draw number hints
+        if debug:
+            return self.label_grid_mask(mask, width, height, rows, cols)
         return mask
 
+    def label_grid_mask(self, mask, width, height, rows, cols):
+        """
+        Copy of a grid mask with cell numbers stamped on, for --debug.
+        The grid itself is not redrawn.
+        """
+        buf = np.array(mask)
+        xs, ys = self.grid_cell_boxes(width, height, rows, cols)[0]
+        for i in range(len(xs)):
+            _stamp_label(buf, i + 1, xs[i], ys[i])
+        return Image.fromarray(buf)
+
+    def grid_cell_boxes(self, width, height, rows, cols):
+        """
+        Ideal cell centers (xs, ys) and (x1, y1, x2, y2) integer corner arrays for a grid, row-major.
+        """
+        return _grid_cell_boxes(width, height, rows, cols)
+
+    def parse_missing_cells(self, issues, rows, cols):
+        """
+        Extract cell indices (row-major, 0-based) from VLM issues like "Missing object at row 2, col 3".
+        """
+        cells = []
+        for issue in issues:
+            match = MISSING_CELL_RE.search(issue)
+            if not match:
+                continue
+            row, col = int(match.group(1)) - 1, int(match.group(2)) - 1
+            if 0 <= row < rows and 0 <= col < cols:
+                cells.append(row * cols + col)
+        return cells
+
+    def cells_to_inpaint(self, issues, rows, cols):
+        """
+        Cells that can be fixed by inpainting alone.
+        Empty when any issue is not a missing cell (alignment, spacing...): those need a full-frame pass.
+        """
+        cells = self.parse_missing_cells(issues, rows, cols)
+        if len(cells) != len(issues):
+            return []
+        return cells
+
+    def crop_cells(self, mask, boxes, cells):
+        """
+        Crop the given cells out of the mask as one (N, size, size) batch.
+        All crops share the largest cell size so they can be stacked.
+        Returns (crops, origins), origins being each crop's (x, y) top-left,
+        shifted inside the image when a cell overflows the edge.
+        """
+        x1, y1, x2, y2 = boxes
+        arr = np.asarray(mask)
+        height, width = arr.shape[:2]
+        size = min(int(max((x2 - x1).max(), (y2 - y1).max())) + 1, width, height)
+        xs = np.clip(x1[cells], 0, width - size)
+        ys = np.clip(y1[cells], 0, height - size)
+        crops = np.stack([arr[y:y + size, x:x + size] for x, y in zip(xs, ys)])
+        return crops, [(int(x), int(y)) for x, y in zip(xs, ys)]
+
     def generate_spiral_mask(self, width, height, count):
         print(f"🛠️  Generating Spiral Mask ({count} items)")
-        mask = Image.new('RGB', (width, height), (0, 0, 0))
+        mask = Image.new('L', (width, height), 0)
         draw = ImageDraw.Draw(mask)
         
         center = (width/2, height/2)
-        points = calculate_spiral_positions(center, count, 'logarithmic', a=20, b=0.35, turns=2.5)
+        xs, ys = calculate_spiral_positions(center, count, 'logarithmic', a=20, b=0.35, turns=2.5)
+        
+        # Item boxes converted to ints once for all points, not per draw call
+        r = 30 # item radius
+        x1 = (xs - r).astype(int).tolist()
+        y1 = (ys - r).astype(int).tolist()
+        x2 = (xs + r).astype(int).tolist()
+        y2 = (ys + r).astype(int).tolist()
         
-        for i, (cx, cy) in enumerate(points):
-            r = 30 # item radius
-            draw.ellipse([cx-r, cy-r, cx+r, cy+r], outline=(255, 255, 255), width=3)
+        for box in zip(x1, y1, x2, y2):
+            draw.ellipse(box, outline=255, width=3)
             
         return mask
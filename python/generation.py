@@ -1,9 +1,96 @@
-import time
+import asyncio
+import os
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+EMBED_THUMB = 16
+EMBED_TEXT_DIM = 256
+
+def embed_query(image_path, prompt):
+    """
+    Joint (image ⊕ prompt) embedding, L2-normalized.
+    Returns None when there is no image to embed: the prompt alone can't tell two images apart.
+    MOCK: grayscale thumbnail + hashed bag of words.
+    In reality: CLIP image and text encoders.
+    """
+    if not os.path.exists(image_path):
+        return None
+    thumb = Image.open(image_path).convert('L').resize((EMBED_THUMB, EMBED_THUMB))
+    image_vec = np.asarray(thumb, dtype=np.float32).ravel() / 255
+    image_vec -= image_vec.mean()
+    if not image_vec.any():
+        # Flat image, nothing to match on
+        return None
+        
+    text_vec = np.zeros(EMBED_TEXT_DIM, dtype=np.float32)
+    for word in prompt.lower().split():
+        text_vec[zlib.crc32(word.encode()) % EMBED_TEXT_DIM] += 1
+        
+    vec = np.concatenate([_normalize(image_vec), _normalize(text_vec)])
+    return _normalize(vec)
+
+def control_channels(control_image):
+    """
+    View a single-channel 'L' guide as (3, H, W) for ControlNet.
+    Broadcasting repeats the channel without copying the pixels.
+    In reality: torch.from_numpy(np.asarray(mask))[None].expand(3, -1, -1)
+    """
+    arr = np.asarray(control_image)
+    if arr.ndim == 3:
+        return arr.transpose(2, 0, 1)
+    return np.broadcast_to(arr[None], (3,) + arr.shape)
+
+def _normalize(vec):
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
 
 class APISelector:
     """
     Intelligent routing for generation APIs.
     """
+    APPRENTICE = "replicate_flux_schnell"
+    MASTER = "gemini_pro_vision"
+
+    def __init__(self, threshold=0.1, max_entries=1024):
+        # Cache-of-Thought memory: query embedding -> prior master answer, in LRU order
+        self.threshold = threshold # max cosine distance for a near-hit
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+
+    def route(self, image_path, prompt):
+        """
+        Returns (api, exemplar).
+        Near-hit on a prior query: cheap apprentice model, prompted with the cached answer.
+        Miss: expensive master model, exemplar is None.
+        """
+        vec = embed_query(image_path, prompt)
+        if vec is not None and self.memory:
+            keys = list(self.memory)
+            vectors = np.stack([self.memory[k][0] for k in keys])
+            # Exact cosine search, the LRU bound keeps the index small
+            dists = 1 - vectors @ vec
+            best = int(np.argmin(dists))
+            if dists[best] < self.threshold:
+                self.memory.move_to_end(keys[best])
+                return self.APPRENTICE, self.memory[keys[best]][1]
+        return self.MASTER, None
+
+    def remember(self, image_path, prompt, answer):
+        """
+        Write a master answer back into the memory, evicting the least recently used entry.
+        """
+        vec = embed_query(image_path, prompt)
+        if vec is None:
+            return
+        key = (image_path, prompt)
+        self.memory[key] = (vec, answer)
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
     def choose_api(self, complexity="low", budget="free", quality="good"):
         if budget == "free":
             return "local_flux_dev" # Using local GPU
@@ -15,24 +102,103 @@ class APISelector:
         return "local_flux_dev"
 
 class GenerationEngine:
-    def __init__(self, mode="local"):
+    def __init__(self, mode="local", compile_mode="reduce-overhead"):
         self.mode = mode
+        # torch.compile mode for the UNet / ControlNets ("max-autotune" for production, None to disable)
+        self.compile_mode = compile_mode
+        # Loaded ControlNets stay resident, a few models serve most requests
+        self.controlnets = {}
         print(f"🎨 Initializing Generation Engine (Mode: {mode})")
         
-    def generate(self, prompt, control_image=None, api="local_flux_dev"):
+        # MOCK: no weights loaded yet
+        # In reality: self.pipe = StableDiffusionControlNetPipeline.from_pretrained(..., torch_dtype=torch.float16).to("cuda")
+        # then self.pipe.unet = self._compile(self.pipe.unet), once: the engine is long-lived
+        
+    async def generate(self, prompt, control_image=None, api="local_flux_dev", controlnet="canny"):
+        """
+        Coroutine, await it from the caller's event loop.
+        """
         print(f"🚀 Generating image with {api}...")
         print(f"   Prompt: {prompt[:50]}...")
-        if control_image:
+        if control_image is not None:
             print("   With ControlNet image guidance.")
+            return await self._generate_with_control(prompt, control_image, controlnet)
             
         # MOCK DELAY
-        time.sleep(1)
+        await asyncio.sleep(1)
         
         # In reality: Call Replicate or Local Pipeline
         # return output_image_path
         return "generated_output.png"
+
+    async def _generate_with_control(self, prompt, control_image, controlnet):
+        """
+        ControlNet and the UNet encoder don't depend on each other,
+        only the UNet decoder needs the ControlNet residuals.
+        Run both concurrently (separate CUDA streams in reality) and join at the middle block.
+        """
+        residuals, hidden = await asyncio.gather(
+            self._run_controlnet(control_image, controlnet),
+            self._run_unet_encoder(prompt),
+        )
+        return await self._run_unet_decoder(hidden, residuals)
+
+    def _load_controlnet(self, name):
+        if name not in self.controlnets:
+            print(f"   Loading ControlNet '{name}'")
+            # MOCK: the name stands in for the model
+            # In reality: model = ControlNetModel.from_pretrained(...).to("cuda")
+            model = name
+            # Compiled once when it becomes resident, reused by every later request
+            self.controlnets[name] = self._compile(model)
+        return self.controlnets[name]
+
+    def _compile(self, model):
+        # Mock models are plain names, nothing to compile
+        if not self.compile_mode or isinstance(model, str):
+            return model
+        import torch
+        print(f"   torch.compile (mode={self.compile_mode})")
+        return torch.compile(model, mode=self.compile_mode)
+
+    async def _run_controlnet(self, control_image, name):
+        model = self._load_controlnet(name)
+        guide = control_channels(control_image)
+        print(f"   ControlNet '{name}' on a {guide.shape[2]}x{guide.shape[1]} guide")
+        # MOCK DELAY
+        await asyncio.sleep(0.5)
+        return f"{model}_residuals"
+
+    async def _run_unet_encoder(self, prompt):
+        # MOCK DELAY
+        await asyncio.sleep(0.5)
+        return "unet_hidden_states"
+
+    async def _run_unet_decoder(self, hidden, residuals):
+        # MOCK DELAY
+        await asyncio.sleep(0.5)
+        return "generated_output.png"
     
     def inpaint(self, base_image, mask_image, prompt):
         print("🖌️  Inpainting missing areas...")
         # MOCK
         return "inpainted_output.png"
+
+    async def inpaint_cells(self, base_image, control_crops, origins, prompt):
+        """
+        Coroutine, like generate.
+        Regenerate only the failed cells, all in one batched ControlNet call.
+        control_crops: (N, H, W) array of single-channel mask crops
+        origins: (x, y) top-left of each crop in the base image
+        """
+        n = len(control_crops)
+        print(f"🖌️  Inpainting {n} cells in one batch ({control_crops.shape[1]}x{control_crops.shape[2]} each)...")
+        
+        # In reality:
+        # outputs = self.pipe(prompt=[prompt] * n, image=list(control_crops), num_inference_steps=20).images
+        # base = Image.open(base_image)
+        # for out, (x, y) in zip(outputs, origins): base.paste(out, (x, y))
+        
+        # MOCK DELAY (one batch instead of a full-frame pass)
+        await asyncio.sleep(0.5)
+        return "inpainted_output.png"
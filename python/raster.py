@@ -0,0 +1,19 @@
+from numba import njit, prange
+
+# Explicit signature: compiled (or loaded from the on-disk cache) once at import,
+# so no mask call ever pays the JIT cost
+@njit("void(uint8[:, ::1], int64[::1], int64[::1], int64[::1], int64[::1], int64)", parallel=True, cache=True)
+def rasterize_rects(buf, x1, y1, x2, y2, thickness):
+    """
+    Write N rectangle outlines into a uint8 (H, W) buffer, one rectangle per thread.
+    Corners are inclusive and the outline grows inward, like ImageDraw.rectangle(width=...).
+    Overlapping writes are harmless: every thread writes the same 255.
+    """
+    for i in prange(x1.shape[0]):
+        # Negative bounds would wrap around, so clamp them to the image edge
+        top, left = max(y1[i], 0), max(x1[i], 0)
+        bottom, right = max(y2[i] + 1, 0), max(x2[i] + 1, 0)
+        buf[top:max(y1[i] + thickness, 0), left:right] = 255
+        buf[max(y2[i] - thickness + 1, 0):bottom, left:right] = 255
+        buf[top:bottom, left:max(x1[i] + thickness, 0)] = 255
+        buf[top:bottom, max(x2[i] - thickness + 1, 0):right] = 255
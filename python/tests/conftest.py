@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The pipeline modules use flat imports (from geometry import ...)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
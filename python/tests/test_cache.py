@@ -0,0 +1,70 @@
+import asyncio
+import subprocess
+import sys
+
+import numpy as np
+
+from analysis import ObjectDetector
+from cache import H5DetectionCache, ResultCache, content_key
+
+HOLD_FILE = """
+import sys, h5py
+with h5py.File(sys.argv[1], 'a'):
+    print('ready', flush=True)
+    sys.stdin.read()
+"""
+
+def test_content_key_depends_on_bytes_not_name(tmp_path):
+    a = tmp_path / "a" / "img.png"
+    b = tmp_path / "b" / "img.png"
+    a.parent.mkdir()
+    b.parent.mkdir()
+    a.write_bytes(b"first")
+    b.write_bytes(b"second")
+    assert content_key(str(a), "prompt") != content_key(str(b), "prompt")
+    
+    b.write_bytes(b"first")
+    assert content_key(str(a), "prompt") == content_key(str(b), "prompt")
+    assert content_key(str(a), "prompt") != content_key(str(a), "other prompt")
+
+def test_result_cache_roundtrip(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.db"))
+    assert cache.get("k") is None
+    cache.set("k", {"object_count": 13, "issues": ["x"]})
+    assert cache.get("k") == {"object_count": 13, "issues": ["x"]}
+
+def test_h5_detection_cache_roundtrip(tmp_path):
+    cache = H5DetectionCache(str(tmp_path / "det.h5"))
+    assert cache.get("k") is None
+    bboxes = [[1, 2, 3, 4, 0.95, 0], [5, 6, 7, 8, 0.5, 1]]
+    cache.set("k", bboxes)
+    np.testing.assert_array_equal(cache.get("k"), bboxes)
+
+def test_h5_detection_cache_runs_uncached_when_locked(tmp_path):
+    path = str(tmp_path / "det.h5")
+    cache = H5DetectionCache(path)
+    cache.set("k", [[1, 2, 3, 4, 0.95, 0]])
+    
+    # Another run holding the file open for writing
+    holder = subprocess.Popen(
+        [sys.executable, "-c", HOLD_FILE, path],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    try:
+        assert holder.stdout.readline().strip() == "ready"
+        assert cache.get("k") is None
+        cache.set("j", [[1, 2, 3, 4, 0.95, 0]])
+    finally:
+        holder.communicate("")
+    
+    assert cache.get("j") is None
+    assert cache.get("k") is not None
+
+def test_detection_cache_hit_matches_miss(tmp_path):
+    image = tmp_path / "img.png"
+    image.write_bytes(b"pixels")
+    detector = ObjectDetector(cache_path=str(tmp_path / "det.h5"))
+    miss = asyncio.run(detector.detect(str(image)))
+    hit = asyncio.run(detector.detect(str(image)))
+    assert hit == miss
+    assert [type(v) for v in hit[0]] == [int, int, int, int, float, int]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from correction import CorrectionEngine
+
+def pil_grid_mask(width, height, rows, cols):
+    """
+    Reference mask: the original per-box ImageDraw.rectangle loop.
+    """
+    mask = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(mask)
+    cell_w = width / (cols + 1)
+    spacing = 20
+    start_x = (width - (cols * (cell_w + spacing) - spacing)) / 2
+    start_y = (height - (rows * (cell_w + spacing) - spacing)) / 2
+    half = cell_w / 2
+    for row in range(rows):
+        for col in range(cols):
+            cx = start_x + col * (cell_w + spacing) + cell_w / 2
+            cy = start_y + row * (cell_w + spacing) + cell_w / 2
+            draw.rectangle([cx - half, cy - half, cx + half, cy + half], outline=255, width=5)
+    return np.asarray(mask)
+
+@pytest.mark.parametrize("width, height, rows, cols", [
+    (1024, 1024, 3, 3),
+    (1024, 1024, 4, 4),
+    (1024, 1024, 4, 5),
+    (1024, 1024, 8, 8),
+    # Grids overflowing the frame: boxes partly or fully outside the image
+    (1024, 1024, 7, 4),
+    (1024, 1024, 8, 4),
+    (1024, 1024, 10, 5),
+    (300, 200, 5, 2),
+])
+def test_grid_mask_matches_pil(width, height, rows, cols):
+    mask = CorrectionEngine().generate_grid_mask(width, height, rows, cols)
+    np.testing.assert_array_equal(np.asarray(mask.convert('L')), pil_grid_mask(width, height, rows, cols))
+
+def test_parse_missing_cells():
+    issues = [
+        "Missing object at row 2, col 3",
+        "missing object at row 4, col 4",
+        "Alignment irregular in row 3",
+        "Missing object at row 5, col 1", # outside a 4x4 grid
+    ]
+    assert CorrectionEngine().parse_missing_cells(issues, 4, 4) == [6, 15]
+
+def test_cells_to_inpaint_falls_back_on_other_issues():
+    corrector = CorrectionEngine()
+    missing = ["Missing object at row 2, col 3", "Missing object at row 4, col 4"]
+    assert corrector.cells_to_inpaint(missing, 4, 4) == [6, 15]
+    assert corrector.cells_to_inpaint(missing + ["Alignment irregular in row 3"], 4, 4) == []
+    assert corrector.cells_to_inpaint(["Missing object at row 9, col 9"], 4, 4) == []
+
+def test_crop_cells_returns_cell_patches():
+    corrector = CorrectionEngine()
+    mask = corrector.generate_grid_mask(1024, 1024, 4, 4)
+    _, boxes = corrector.grid_cell_boxes(1024, 1024, 4, 4)
+    crops, origins = corrector.crop_cells(mask, boxes, [0, 6])
+    
+    x1, y1, x2, y2 = boxes
+    size = crops.shape[1]
+    assert size >= int(x2[0] - x1[0]) + 1
+    assert crops.shape[:3] == (2, size, size)
+    assert origins == [(int(x1[0]), int(y1[0])), (int(x1[6]), int(y1[6]))]
+    arr = np.asarray(mask)
+    for crop, (x, y) in zip(crops, origins):
+        np.testing.assert_array_equal(crop, arr[y:y + size, x:x + size])
+        # Outline corner at the origin, empty cell interior
+        assert crop[0, 0].all() and not crop[size // 2, size // 2].any()
+
+def test_crop_cells_overflowing_grid_stays_in_frame():
+    corrector = CorrectionEngine()
+    # 8x8 at 1024 overflows the frame, its corner cells start at negative coordinates
+    mask = corrector.generate_grid_mask(1024, 1024, 8, 8)
+    _, boxes = corrector.grid_cell_boxes(1024, 1024, 8, 8)
+    crops, origins = corrector.crop_cells(mask, boxes, [0, 7, 63])
+    
+    size = crops.shape[1]
+    assert crops.shape[:3] == (3, size, size)
+    for x, y in origins:
+        assert 0 <= x <= 1024 - size and 0 <= y <= 1024 - size
+
+def test_masks_are_single_channel():
+    corrector = CorrectionEngine()
+    assert corrector.generate_grid_mask(256, 256, 2, 2).mode == 'L'
+    assert corrector.generate_spiral_mask(256, 256, 6).mode == 'L'
+
+def test_debug_grid_mask_adds_cell_numbers():
+    corrector = CorrectionEngine()
+    plain = np.asarray(corrector.generate_grid_mask(1024, 1024, 4, 4))
+    labelled = np.asarray(corrector.generate_grid_mask(1024, 1024, 4, 4, debug=True))
+    # Labels only add white pixels, the outlines are untouched
+    assert (labelled[plain > 0] == 255).all()
+    assert (labelled > 0).sum() > (plain > 0).sum()
+
+def test_label_grid_mask_leaves_input_unchanged():
+    corrector = CorrectionEngine()
+    mask = corrector.generate_grid_mask(1024, 1024, 4, 4)
+    before = np.asarray(mask).copy()
+    labelled = corrector.label_grid_mask(mask, 1024, 1024, 4, 4)
+    assert (np.asarray(mask) == before).all()
+    assert (np.asarray(labelled) == np.asarray(corrector.generate_grid_mask(1024, 1024, 4, 4, debug=True))).all()
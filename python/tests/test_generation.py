@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+from PIL import Image
+
+from generation import APISelector, GenerationEngine, control_channels
+
+def test_control_channels_broadcasts_without_copy():
+    mask = Image.new('L', (8, 4), 0)
+    guide = control_channels(mask)
+    assert guide.shape == (3, 4, 8)
+    assert guide.strides[0] == 0
+
+def test_generate_runs_inside_event_loop():
+    engine = GenerationEngine(compile_mode=None)
+    
+    async def run():
+        return await engine.generate("a grid", control_image=Image.new('L', (8, 8), 0))
+    
+    assert asyncio.run(run()) == "generated_output.png"
+    assert "canny" in engine.controlnets
+
+def write_image(path, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (64, 64), dtype=np.uint8)).save(path)
+    return str(path)
+
+def test_route_near_hit_uses_apprentice_with_exemplar(tmp_path):
+    first = write_image(tmp_path / "first.png", 0)
+    copy = write_image(tmp_path / "copy.png", 0)
+    other = write_image(tmp_path / "other.png", 1)
+    selector = APISelector()
+    
+    assert selector.route(first, "A grid of 16 books") == (selector.MASTER, None)
+    selector.remember(first, "A grid of 16 books", {"object_count": 13})
+    assert selector.route(copy, "a grid of 16 books") == (selector.APPRENTICE, {"object_count": 13})
+    assert selector.route(other, "A grid of 16 books") == (selector.MASTER, None)
+
+def test_route_missing_image_is_a_miss(tmp_path):
+    selector = APISelector()
+    selector.remember(str(tmp_path / "x.png"), "A grid", {"object_count": 13})
+    assert selector.route(str(tmp_path / "y.png"), "A grid") == (selector.MASTER, None)
+    assert not selector.memory
+
+def test_remember_evicts_least_recently_used(tmp_path):
+    a, b, c = (write_image(tmp_path / f"{n}.png", i) for i, n in enumerate("abc"))
+    selector = APISelector(max_entries=2)
+    selector.remember(a, "p", 1)
+    selector.remember(b, "p", 2)
+    # Touch a, so b becomes the oldest
+    assert selector.route(a, "p") == (selector.APPRENTICE, 1)
+    selector.remember(c, "p", 3)
+    assert [key[0] for key in selector.memory] == [a, c]
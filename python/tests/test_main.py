@@ -0,0 +1,58 @@
+import asyncio
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+from analysis import VLMAnalyzer
+from generation import GenerationEngine
+
+SINGLETONS = [main._get_vlm, main._get_detector, main._get_corrector, main._get_generator, main._get_selector]
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Cache files are created relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    for get in SINGLETONS:
+        get.cache_clear()
+    rng = np.random.default_rng(0)
+    Image.fromarray(rng.integers(0, 256, (64, 64), dtype=np.uint8)).save("grid.png")
+    yield tmp_path
+    for get in SINGLETONS:
+        get.cache_clear()
+
+def test_repeat_run_hits_exact_cache(workdir, monkeypatch):
+    calls = []
+    run_model = VLMAnalyzer._run_model
+    
+    def counting(self, *args):
+        calls.append(args)
+        return run_model(self, *args)
+    
+    monkeypatch.setattr(VLMAnalyzer, "_run_model", counting)
+    asyncio.run(main.run_pipeline("grid.png", "A grid of 16 books"))
+    asyncio.run(main.run_pipeline("grid.png", "A grid of 16 books"))
+    assert len(calls) == 1
+
+def test_missing_cells_are_inpainted_as_one_batch(workdir, monkeypatch):
+    def only_missing(self, image_path, prompt, model, exemplar):
+        return {
+            "object_count": 14,
+            "expected_count": 16,
+            "issues": ["Missing object at row 2, col 3", "Missing object at row 4, col 4"],
+        }
+    
+    batches = []
+    
+    async def inpaint_cells(self, base_image, control_crops, origins, prompt):
+        batches.append((control_crops, origins))
+        return "inpainted_output.png"
+    
+    monkeypatch.setattr(VLMAnalyzer, "_run_model", only_missing)
+    monkeypatch.setattr(GenerationEngine, "inpaint_cells", inpaint_cells)
+    asyncio.run(main.run_pipeline("grid.png", "A grid of 16 books"))
+    
+    [(crops, origins)] = batches
+    assert crops.ndim == 3 and crops.shape[0] == 2 == len(origins)
+    assert crops.shape[1] == crops.shape[2]
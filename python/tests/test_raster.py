@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from raster import rasterize_rects
+
+def pil_outlines(shape, boxes, thickness):
+    mask = Image.new('L', (shape[1], shape[0]), 0)
+    draw = ImageDraw.Draw(mask)
+    for box in boxes:
+        draw.rectangle(box, outline=255, width=thickness)
+    return np.asarray(mask)
+
+@pytest.mark.parametrize("boxes", [
+    [(10, 10, 60, 50)],
+    # Straddling each edge
+    [(-20, 10, 30, 50), (10, -20, 50, 30), (80, 10, 130, 50), (10, 70, 50, 120)],
+    # Entirely outside: above, left, below, right
+    [(10, -60, 50, -10), (-60, 10, -10, 50), (10, 110, 50, 150), (110, 10, 150, 50)],
+    # Overlapping
+    [(10, 10, 60, 60), (40, 40, 90, 90)],
+])
+@pytest.mark.parametrize("thickness", [1, 5])
+def test_rasterize_rects_matches_pil(boxes, thickness):
+    shape = (100, 100)
+    x1, y1, x2, y2 = (np.array(v, dtype=np.int64) for v in zip(*boxes))
+    buf = np.zeros(shape, dtype=np.uint8)
+    rasterize_rects(buf, x1, y1, x2, y2, thickness)
+    np.testing.assert_array_equal(buf, pil_outlines(shape, boxes, thickness))